@@ -20,9 +20,14 @@ from shapely.geometry import Polygon, mapping
 import laspy
 from geounl.GeoUtils import geodata_to_geohash
 import rasterio
+from rasterio.warp import transform_bounds
 from PIL import Image
 import PIL.ExifTags
 import hashlib
+import tempfile
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 
 
 
@@ -45,6 +50,24 @@ base_url = os.environ.get('CATALOG_SERVICE')
 
 
 
+# SETTING UP THE DERIVED THUMBNAIL ASSETS (LONGEST EDGE IN PIXELS, AND THE FILE FORMATS THAT CAN BE PREVIEWED)
+THUMBNAIL_MAX_SIZE = 256
+THUMBNAIL_EXTENSIONS = ('.tif', '.jpg', '.jpeg', '.png')
+THUMBNAIL_MEDIA_TYPES = {'png': MediaType.PNG, 'webp': 'image/webp'}
+
+
+
+
+
+# SETTING UP THE GEOHASH CELLS USED TO GROUP ASSETS INTO STAC ITEMS
+GEOHASH_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 5
+NON_GEOSPATIAL_CELL_ID = '7zzzzzzzzz'  # Bounding box around the point (0,0) used for assets without a footprint
+
+
+
+
+
 # # SETTING UP ENVIRONMENT VARIABLES FOR "SERVER" AND "PORT" AS PART OF THE "PYUNL" PYTHON LIBRARY
 # os.environ['QUANTIZATION_SERVER'] = 'your_custom_server_address'
 # os.environ['QUANTIZATION_PORT'] = 'your_custom_port_number'
@@ -328,6 +351,9 @@ def delete_asset_from_path(vpm_id, cell_id, assets_to_delete):
             print(f"Asset '{asset_to_delete}' has been deleted locally.")
             assets_deleted = True
 
+            # Also drop the thumbnail of the asset, so it doesn't outlive the asset it previews
+            item_data["assets"].pop(f"{asset_to_delete}_thumbnail", None)
+
     if assets_deleted:
         # If this was the last asset, delete the item
         if len(item_data["assets"]) == 0:
@@ -388,7 +414,8 @@ def create_stac_collection(vpm_id, licence, start_datetime=None, end_datetime=No
 
 
 # FUNCTION 24: THIS IS A FUNCTION TO PREPARE A STAC ITEM
-def create_stac_item(vpm_id, cell_id, asset_paths, collection, original_path):
+def create_stac_item(vpm_id, cell_id, asset_paths, collection, original_path, thumbnail_dir=None,
+                     thumbnail_base_url=None, thumbnail_format='png', thumbnail_max_size=THUMBNAIL_MAX_SIZE):
     # Define constraints for the STAC items
     item_id = f"{cell_id}_{vpm_id}"  # STAC item ID
 
@@ -407,6 +434,10 @@ def create_stac_item(vpm_id, cell_id, asset_paths, collection, original_path):
                 datetime=parsed_datetime,
                 properties={})
 
+    # Render the thumbnails of all the previewable assets in one go, if requested
+    thumbnail_paths = create_thumbnails(asset_paths, thumbnail_dir, thumbnail_max_size,
+                                        thumbnail_format) if thumbnail_dir else {}
+
     for asset_path, orig_path in zip(asset_paths, original_path):
         file_extension = os.path.splitext(asset_path)[1]
         handler = select_handler(file_extension)
@@ -416,6 +447,10 @@ def create_stac_item(vpm_id, cell_id, asset_paths, collection, original_path):
         asset = create_asset_from_path(asset_path, orig_path)
         item.add_asset(asset_id, asset)
 
+        if asset_path in thumbnail_paths:
+            thumbnail_asset = create_thumbnail_asset(thumbnail_paths[asset_path], thumbnail_base_url)
+            item.add_asset(f"{asset_id}_thumbnail", thumbnail_asset)
+
     # Convert the PySTAC Item to a dictionary, then to a JSON string
     item_data = json.dumps(item.to_dict())
 
@@ -527,7 +562,8 @@ def update_stac_collection(vpm_id):
 
 
 # FUNCTION 28: THIS IS A FUNCTION FOR UPDATING STAC ITEMS
-def update_stac_item(vpm_id, cell_id, new_asset_paths, original_path):
+def update_stac_item(vpm_id, cell_id, new_asset_paths, original_path, thumbnail_dir=None,
+                     thumbnail_base_url=None, thumbnail_format='png', thumbnail_max_size=THUMBNAIL_MAX_SIZE):
     cell_id = f"{cell_id}_{vpm_id}"
 
     # Step 1: Get the STAC Item
@@ -542,20 +578,35 @@ def update_stac_item(vpm_id, cell_id, new_asset_paths, original_path):
     # Initialize a variable to keep track of whether any new assets were added or updated
     asset_updated = False
 
+    # Keep track of the assets that are written to the item, or that still lack their thumbnail
+    missing_thumbnails = {}
+
     for new_asset_path, orig_path in zip(new_asset_paths, original_path):
         file_extension = os.path.splitext(new_asset_path)[1]
         handler = select_handler(file_extension)
         fields = handler(new_asset_path)
 
         asset_id = generate_asset_id(new_asset_path, fields)
-        new_asset = create_asset_from_path(new_asset_path, orig_path)
 
         if asset_id in item_data["assets"]:
-            # If asset with the same SHA-256-based asset ID exists, skip it
+            # If asset with the same SHA-256-based asset ID exists, skip it unless its thumbnail is missing
+            if f"{asset_id}_thumbnail" not in item_data["assets"]:
+                missing_thumbnails[new_asset_path] = asset_id
             continue
         else:
             # If asset doesn't exist, add the new asset
+            new_asset = create_asset_from_path(new_asset_path, orig_path)
             item_data["assets"][asset_id] = new_asset.to_dict()
+            missing_thumbnails[new_asset_path] = asset_id
+            asset_updated = True
+
+    # Step 2: Render the thumbnails, if requested, only for the assets that don't have one in the item yet
+    if thumbnail_dir and missing_thumbnails:
+        thumbnail_paths = create_thumbnails(list(missing_thumbnails), thumbnail_dir, thumbnail_max_size,
+                                            thumbnail_format)
+        for new_asset_path, thumbnail_path in thumbnail_paths.items():
+            thumbnail_asset = create_thumbnail_asset(thumbnail_path, thumbnail_base_url)
+            item_data["assets"][f"{missing_thumbnails[new_asset_path]}_thumbnail"] = thumbnail_asset.to_dict()
             asset_updated = True
 
     # Step 3: Update the datetime if a new asset was added or an existing asset was updated
@@ -640,7 +691,9 @@ def print_stac_collection_items(vpm_id):
 
 
 # FUNCTION 32: THIS IS A FUNCTION FOR PERFORMING THE ENTIRE DATA MANAGEMENT AS PART OF STAC CATALOGING
-def stac_catalog(vpm_id, licence, asset_paths, original_path, assets_to_delete=[], delete_collection=[]):
+def stac_catalog(vpm_id, licence, asset_paths, original_path, assets_to_delete=[], delete_collection=[],
+                 thumbnail_dir=None, thumbnail_base_url=None, thumbnail_format='png',
+                 thumbnail_max_size=THUMBNAIL_MAX_SIZE):
     # Get cell_id from find_smallest_geohash()
     # cell_id = geodata_to_geohash.find_smallest_geohash(asset_paths)
     cell_id = "te"
@@ -674,19 +727,22 @@ def stac_catalog(vpm_id, licence, asset_paths, original_path, assets_to_delete=[
                                             start_datetime=None,
                                             end_datetime=None,
                                             spatial_extent=None)
-        create_stac_item(vpm_id, cell_id, asset_paths, collection, original_path)
+        create_stac_item(vpm_id, cell_id, asset_paths, collection, original_path, thumbnail_dir,
+                         thumbnail_base_url, thumbnail_format, thumbnail_max_size)
         update_stac_collection(vpm_id)
         # return [item_id]
 
     # If collection is available and item is empty, then create item, and update collection.
     elif collection_read is not None and item_read is None:
-        create_stac_item(vpm_id, cell_id, asset_paths, collection_read, original_path)
+        create_stac_item(vpm_id, cell_id, asset_paths, collection_read, original_path, thumbnail_dir,
+                         thumbnail_base_url, thumbnail_format, thumbnail_max_size)
         update_stac_collection(vpm_id)
         # return [item_id]
 
     # If both collection and item are available, then run the function for updating the stac item and update the stac collection.
     elif collection_read is not None and item_read is not None:
-        update_stac_item(vpm_id, cell_id, asset_paths, original_path)
+        update_stac_item(vpm_id, cell_id, asset_paths, original_path, thumbnail_dir,
+                         thumbnail_base_url, thumbnail_format, thumbnail_max_size)
         update_stac_collection(vpm_id)
         # return [item_id]
 
@@ -697,4 +753,480 @@ def stac_catalog(vpm_id, licence, asset_paths, original_path, assets_to_delete=[
     return [item_id]
 
 
+# FUNCTION 33: THIS FUNCTION COMPUTES THE SHA256 OF THE CONTENT OF A FILE, WHICH IS USED TO CACHE ITS THUMBNAIL
+def compute_file_sha256(file_path, chunk_size=1024 * 1024):
+    """Compute the SHA-256 hash of the content of the given file."""
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+# FUNCTION 34: THIS FUNCTION RENDERS A SMALL PREVIEW IMAGE OF A .tif, .jpg OR .png FILE
+def render_thumbnail(file_path, max_size=THUMBNAIL_MAX_SIZE):
+    file_extension = os.path.splitext(file_path)[1]
+
+    if file_extension == '.tif':
+        with rasterio.open(file_path) as dataset:
+            # Decimated read: rasterio serves it from the overviews of the file whenever they exist
+            scale = min(1.0, max_size / max(dataset.width, dataset.height))
+            out_height = max(1, int(dataset.height * scale))
+            out_width = max(1, int(dataset.width * scale))
+            indexes = [1, 2, 3] if dataset.count >= 3 else [1]
+            data = dataset.read(indexes, out_shape=(len(indexes), out_height, out_width), masked=True)
+
+        # Stretch every band linearly to 8-bit, leaving the nodata pixels black
+        bands = []
+        for band in data.astype('float64'):
+            low, high = band.min(), band.max()
+            if band.count() == 0 or high == low:
+                bands.append(np.zeros(band.shape, dtype=np.uint8))
+            else:
+                bands.append(((band - low) * 255.0 / (high - low)).filled(0).astype(np.uint8))
+
+        if len(bands) == 1:
+            return Image.fromarray(bands[0])
+        return Image.fromarray(np.dstack(bands))
+
+    image = Image.open(file_path)
+    # For JPEGs, draft() lets the decoder downscale by up to 8x so the full resolution is never decoded
+    image.draft('RGB', (max_size, max_size))
+    if image.mode not in ('RGB', 'RGBA', 'L'):
+        image = image.convert('RGBA')
+    # thumbnail() uses reduce() before resampling, which keeps large PNGs cheap to shrink
+    image.thumbnail((max_size, max_size))
+    return image
+
+
+# FUNCTION 35: THIS FUNCTION GENERATES THE THUMBNAIL OF A FILE, OR RETURNS THE CACHED ONE IF THE CONTENT IS UNCHANGED
+def generate_thumbnail(file_path, thumbnail_dir, max_size=THUMBNAIL_MAX_SIZE, thumbnail_format='png'):
+    # The thumbnail is named after the content hash, so an unchanged file is never rendered again
+    content_hash = compute_file_sha256(file_path)
+    thumbnail_path = os.path.join(thumbnail_dir, f"{content_hash}_{max_size}.{thumbnail_format}")
+
+    if os.path.exists(thumbnail_path):
+        return thumbnail_path
+
+    image = render_thumbnail(file_path, max_size)
+
+    # Write to a unique temporary file first, so concurrent workers rendering files with identical content, or an
+    # interrupted run, never leave a partial thumbnail behind
+    temp_fd, temp_path = tempfile.mkstemp(dir=thumbnail_dir, suffix='.tmp')
+    try:
+        with os.fdopen(temp_fd, 'wb') as f:
+            image.save(f, format=thumbnail_format.upper())
+        os.replace(temp_path, thumbnail_path)
+    except Exception:
+        os.remove(temp_path)
+        raise
+
+    return thumbnail_path
+
+
+# FUNCTION 36: THIS FUNCTION GENERATES THE THUMBNAILS OF A LIST OF FILES IN A POOL OF WORKERS
+def create_thumbnails(asset_paths, thumbnail_dir, max_size=THUMBNAIL_MAX_SIZE, thumbnail_format='png',
+                      max_workers=None):
+    os.makedirs(thumbnail_dir, exist_ok=True)
+
+    # Only the raster and image formats can be previewed, and every file only needs to be rendered once
+    previewable_paths = list(dict.fromkeys(
+        path for path in asset_paths if os.path.splitext(path)[1] in THUMBNAIL_EXTENSIONS))
+
+    thumbnail_paths = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {path: executor.submit(generate_thumbnail, path, thumbnail_dir, max_size, thumbnail_format)
+                   for path in previewable_paths}
+        for path, future in futures.items():
+            try:
+                thumbnail_paths[path] = future.result()
+            except Exception as e:
+                # A preview is optional, so a file that can't be rendered must not stop the cataloguing
+                print(f"Failed to generate thumbnail for {path}: {e}")
+
+    return thumbnail_paths
+
+
+# FUNCTION 37: THIS IS A FUNCTION TO CREATE A THUMBNAIL STAC ASSET TO BE ADDED WITHIN A STAC ITEM
+def create_thumbnail_asset(thumbnail_path, thumbnail_base_url=None):
+    thumbnail_format = os.path.splitext(thumbnail_path)[1].lstrip('.')
+
+    # Publish the thumbnail under the URL its directory is served from, as browsers can't fetch a local path
+    if thumbnail_base_url:
+        href = f"{thumbnail_base_url.rstrip('/')}/{os.path.basename(thumbnail_path)}"
+    else:
+        href = thumbnail_path
+
+    return Asset(href=href,
+                 media_type=THUMBNAIL_MEDIA_TYPES.get(thumbnail_format),
+                 roles=['thumbnail'])
+
+
+# FUNCTION 38: THIS IS A FUNCTION TO CREATE A POOLED HTTP SESSION SHARED BY CONCURRENT REQUESTS TO THE STAC-API
+def create_pooled_session(pool_size=8):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# FUNCTION 39: THIS IS A FUNCTION TO SEARCH STAC ITEMS ACROSS COLLECTIONS USING THE SERVER-SIDE /search ENDPOINT
+def search_stac_items(session, vpm_ids, bbox=None, datetime_range=None, item_ids=None, asset_ids=None, limit=500):
+    # A single collection ID can be given on its own, like the vpm_id of every other function
+    if isinstance(vpm_ids, str):
+        vpm_ids = [vpm_ids]
+
+    search_body = {"collections": list(vpm_ids), "limit": limit}
+    if bbox is not None:
+        search_body["bbox"] = list(bbox)
+    if isinstance(datetime_range, str):
+        search_body["datetime"] = datetime_range
+    elif datetime_range is not None:
+        # The /search endpoint takes an RFC 3339 interval string, so a (start, end) pair is joined into "start/end",
+        # with ".." for an open end
+        interval = []
+        for bound in datetime_range:
+            if bound is None:
+                interval.append("..")
+            elif isinstance(bound, datetime):
+                bound = bound if bound.tzinfo is not None else bound.replace(tzinfo=timezone.utc)
+                interval.append(bound.isoformat())
+            else:
+                interval.append(str(bound))
+        search_body["datetime"] = "/".join(interval)
+    if item_ids is not None:
+        search_body["ids"] = list(item_ids)
+
+    items = []
+    request_kwargs = {"method": "POST", "url": f"{base_url}/search", "json": search_body}
+
+    # Follow the "next" links until every page of the search result has been read
+    while request_kwargs is not None:
+        response = session.request(**request_kwargs)
+        if response.status_code != 200:
+            print(f"Failed to search STAC Items. Response status code: {response.status_code}")
+            return None
+
+        result = response.json()
+        items.extend(result["features"])
+
+        request_kwargs = None
+        for link in result.get("links", []):
+            if link["rel"] == "next":
+                if link.get("method", "GET").upper() == "POST":
+                    next_body = link.get("body", search_body)
+                    if link.get("merge"):
+                        next_body = {**search_body, **next_body}
+                    request_kwargs = {"method": "POST", "url": link["href"], "json": next_body}
+                else:
+                    request_kwargs = {"method": "GET", "url": link["href"]}
+                break
+
+    # The asset IDs are not a search parameter of the STAC-API, so they are matched on the returned items
+    if asset_ids is not None:
+        asset_ids = set(asset_ids)
+        items = [item for item in items if asset_ids.intersection(item["assets"])]
+
+    return items
+
+
+# FUNCTION 40: THIS IS A FUNCTION TO DELETE A STAC ITEM, OR ONLY PRUNE SOME OF ITS ASSETS, OVER A SHARED SESSION
+def delete_or_prune_stac_item(session, item_data, assets_to_delete=None):
+    vpm_id = item_data["collection"]
+    item_url = f"{base_url}/collections/{vpm_id}/items/{item_data['id']}"
+
+    if assets_to_delete is not None:
+        # The thumbnails of the deleted assets are deleted along with them
+        pruned_ids = set(assets_to_delete) | {f"{asset_id}_thumbnail" for asset_id in assets_to_delete}
+        remaining_assets = {k: v for k, v in item_data["assets"].items() if k not in pruned_ids}
+        if len(remaining_assets) == len(item_data["assets"]):
+            return False
+
+        # Update the STAC Item in the database if it still contains assets
+        if len(remaining_assets) > 0:
+            item_data["assets"] = remaining_assets
+            try:
+                response = session.put(item_url, json=item_data)
+            except requests.RequestException as e:
+                print(f"Failed to update STAC Item {item_data['id']}: {e}")
+                return False
+            if response.status_code == 200:
+                return True
+            print(f"Failed to update STAC Item {item_data['id']}. Response status code: {response.status_code}")
+            return False
+
+    # If the whole item was selected, or this was its last asset, delete the item
+    try:
+        response = session.delete(item_url)
+    except requests.RequestException as e:
+        print(f"Failed to delete STAC Item {item_data['id']}: {e}")
+        return False
+    if response.status_code == 200:
+        return True
+    print(f"Failed to delete STAC Item {item_data['id']}. Response status code: {response.status_code}")
+    return False
+
+
+# FUNCTION 41: THIS IS A FUNCTION TO DELETE MANY STAC ITEMS, OR PRUNE THEIR ASSETS, ACROSS MANY STAC COLLECTIONS
+def bulk_delete_stac_items(vpm_ids, bbox=None, datetime_range=None, item_ids=None, assets_to_delete=None,
+                           max_workers=8, delete_all=False):
+    # Without any selector the search matches every item of the collections, so that must be asked for explicitly
+    if bbox is None and datetime_range is None and item_ids is None and assets_to_delete is None and not delete_all:
+        raise ValueError("No bbox, datetime_range, item_ids or assets_to_delete given; "
+                         "pass delete_all=True to delete every item of the collections")
+
+    session = create_pooled_session(max_workers)
+    try:
+        # Step 1: Select the items with a single server-side search instead of one GET per item
+        items = search_stac_items(session, vpm_ids, bbox=bbox, datetime_range=datetime_range,
+                                  item_ids=item_ids, asset_ids=assets_to_delete)
+        if items is None:
+            return None
+
+        # Step 2: Delete the items, or prune their assets, concurrently over the pooled connections
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(lambda item: delete_or_prune_stac_item(session, item, assets_to_delete),
+                                        items))
+    finally:
+        session.close()
+
+    changed_items = [item for item, changed in zip(items, results) if changed]
+    print(f"Successfully deleted or pruned {len(changed_items)} of {len(items)} selected STAC Items.")
+
+    # Step 3: Recompute the extent of every affected collection once, rather than once per item
+    for vpm_id in dict.fromkeys(item["collection"] for item in changed_items):
+        response = requests.get(f"{base_url}/collections/{vpm_id}/items", params={"limit": 1})
+        if response.status_code == 200 and len(response.json()["features"]) == 0:
+            # update_stac_collection() leaves the extent of an empty collection untouched, so a fully retired
+            # collection gets its extent reset to the empty one it was created with
+            collection = read_stac_collection(vpm_id)
+            if collection is not None:
+                collection["extent"]["spatial"]["bbox"] = [[None, None, None, None]]
+                collection["extent"]["temporal"]["interval"] = [[None, None]]
+                response = requests.put(f"{base_url}/collections", json=collection)
+                if response.status_code == 200:
+                    print(f"Successfully reset the extent of the emptied STAC Collection {vpm_id}.")
+                else:
+                    print(
+                        f"Failed to update STAC Collection. Response status code: {response.status_code}")
+        else:
+            update_stac_collection(vpm_id)
+
+    return [item["id"] for item in changed_items]
+
+
+# FUNCTION 42: THIS FUNCTION EXTRACTS THE FOOTPRINT (BOUNDING BOX IN WGS84) OF A FILE, OR NONE IF IT HAS NO LOCATION
+def get_file_footprint(file_path):
+    file_extension = os.path.splitext(file_path)[1]
+
+    if file_extension == '.tif':
+        with rasterio.open(file_path) as dataset:
+            bounds, crs = tuple(dataset.bounds), dataset.crs
+    elif file_extension in ('.geojson', '.shp', '.fgb'):
+        with fiona.open(file_path, 'r') as src:
+            bounds, crs = src.bounds, src.crs_wkt or None
+    elif file_extension == '.las':
+        # Only the header is read, the points themselves are never loaded
+        with laspy.open(file_path) as las_file:
+            header = las_file.header
+            bounds = (header.mins[0], header.mins[1], header.maxs[0], header.maxs[1])
+            las_crs = header.parse_crs()
+            crs = las_crs.to_wkt() if las_crs is not None else None
+    else:
+        return None
+
+    # Without a CRS the bounds may just as well be projected metres or pixels, so the file can't be located
+    if crs is None:
+        return None
+
+    west, south, east, north = transform_bounds(crs, 'EPSG:4326', *bounds)
+
+    # Bounds overshooting the globe by a rounding error (e.g. a global raster) are clamped, while anything further
+    # out isn't a real location. A footprint crossing the antimeridian keeps west > east, as in a STAC bbox
+    tolerance = 1e-6
+    if not (-180.0 - tolerance <= min(west, east) and max(west, east) <= 180.0 + tolerance
+            and -90.0 - tolerance <= south <= north <= 90.0 + tolerance):
+        return None
+    west, east = min(max(west, -180.0), 180.0), min(max(east, -180.0), 180.0)
+    south, north = max(south, -90.0), min(north, 90.0)
+    return [float(west), float(south), float(east), float(north)]
+
+
+# FUNCTION 43: THIS FUNCTION ENCODES ARRAYS OF LONGITUDES AND LATITUDES INTO INTEGER GEOHASH CODES IN ONE PASS
+def encode_geohash_codes(lons, lats, precision=GEOHASH_PRECISION):
+    num_bits = 5 * precision
+    lon_bits, lat_bits = (num_bits + 1) // 2, num_bits // 2
+
+    # Quantize the coordinates onto the finest grid of the requested precision
+    lon_cells = np.floor((np.asarray(lons, dtype='float64') + 180.0) / 360.0 * 2 ** lon_bits)
+    lat_cells = np.floor((np.asarray(lats, dtype='float64') + 90.0) / 180.0 * 2 ** lat_bits)
+    lon_cells = np.clip(lon_cells, 0, 2 ** lon_bits - 1).astype(np.uint64)
+    lat_cells = np.clip(lat_cells, 0, 2 ** lat_bits - 1).astype(np.uint64)
+
+    # Interleave the bits, starting with the longitude
+    codes = np.zeros(lon_cells.shape, dtype=np.uint64)
+    for i in range(num_bits):
+        if i % 2 == 0:
+            bit = (lon_cells >> np.uint64(lon_bits - 1 - i // 2)) & np.uint64(1)
+        else:
+            bit = (lat_cells >> np.uint64(lat_bits - 1 - i // 2)) & np.uint64(1)
+        codes = (codes << np.uint64(1)) | bit
+    return codes
+
+
+# FUNCTION 44: THIS FUNCTION CONVERTS AN INTEGER GEOHASH CODE INTO ITS GEOHASH STRING
+def geohash_code_to_string(code, precision=GEOHASH_PRECISION, length=None):
+    length = precision if length is None else length
+    code = int(code) >> (5 * (precision - length))
+    return ''.join(GEOHASH_BASE32[(code >> (5 * (length - 1 - i))) & 31] for i in range(length))
+
+
+# FUNCTION 45: THIS FUNCTION FINDS THE SMALLEST GEOHASH CELL(S) COVERING EACH FOOTPRINT IN A LIST OF FOOTPRINTS
+def covering_geohashes(footprints, precision=GEOHASH_PRECISION, max_split_cells=4):
+    footprints = np.asarray(footprints, dtype='float64').reshape(-1, 4)
+
+    # A footprint crossing the antimeridian (west > east) is handled as its two parts on either side of it
+    crossing = footprints[:, 0] > footprints[:, 2]
+    eastern_parts, western_parts = footprints[crossing].copy(), footprints[crossing].copy()
+    eastern_parts[:, 2], western_parts[:, 0] = 180.0, -180.0
+    parts = np.concatenate([footprints[~crossing], eastern_parts, western_parts])
+    owners = np.concatenate([np.flatnonzero(~crossing), np.flatnonzero(crossing), np.flatnonzero(crossing)])
+
+    def cell_ranges(boxes, length):
+        # The first and last column and row of the grid of cells of the given length intersected by every box
+        lon_bits, lat_bits = (5 * length + 1) // 2, (5 * length) // 2
+        lon_cells = np.clip(np.floor((boxes[:, [0, 2]] + 180.0) / 360.0 * 2 ** lon_bits), 0, 2 ** lon_bits - 1)
+        lat_cells = np.clip(np.floor((boxes[:, [1, 3]] + 90.0) / 180.0 * 2 ** lat_bits), 0, 2 ** lat_bits - 1)
+        return lon_bits, lat_bits, lon_cells, lat_cells
+
+    south_west = encode_geohash_codes(parts[:, 0], parts[:, 1], precision)
+    north_east = encode_geohash_codes(parts[:, 2], parts[:, 3], precision)
+
+    # A geohash cell covers a footprint when it covers both of its corners, i.e. the common prefix of the two codes
+    different_bits = south_west ^ north_east
+    common_lengths = np.zeros(len(parts), dtype=int)
+    for length in range(1, precision + 1):
+        common_lengths += (different_bits >> np.uint64(5 * (precision - length))) == 0
+
+    # The scale of a footprint is the finest length at which it intersects no more than max_split_cells cells
+    scale_lengths = np.ones(len(parts), dtype=int)
+    for length in range(1, precision + 1):
+        _, _, lon_cells, lat_cells = cell_ranges(parts, length)
+        num_cells = (lon_cells[:, 1] - lon_cells[:, 0] + 1) * (lat_cells[:, 1] - lat_cells[:, 0] + 1)
+        scale_lengths = np.where(num_cells <= max_split_cells, length, scale_lengths)
+
+    cells = [[] for _ in range(len(footprints))]
+    for part, owner, code, length, scale_length in zip(parts, owners, south_west, common_lengths, scale_lengths):
+        if length > 0 and length >= scale_length - 1:
+            part_cells = [geohash_code_to_string(code, precision, length)]
+        else:
+            # A footprint straddling a boundary has only a covering cell much coarser than itself, if any, which
+            # would absorb all of its neighbours. It is split instead across the cells of its own scale that it
+            # intersects; together these cover the footprint, and the file joins every one of them
+            lon_bits, lat_bits, lon_cells, lat_cells = cell_ranges(part[np.newaxis, :], scale_length)
+            lon_centres = (np.arange(lon_cells[0, 0], lon_cells[0, 1] + 1) + 0.5) * 360.0 / 2 ** lon_bits - 180.0
+            lat_centres = (np.arange(lat_cells[0, 0], lat_cells[0, 1] + 1) + 0.5) * 180.0 / 2 ** lat_bits - 90.0
+            lon_grid, lat_grid = np.meshgrid(lon_centres, lat_centres)
+            split_codes = encode_geohash_codes(lon_grid.ravel(), lat_grid.ravel(), scale_length)
+            part_cells = [geohash_code_to_string(split_code, scale_length) for split_code in split_codes]
+        cells[owner].extend(cell for cell in part_cells if cell not in cells[owner])
+
+    return cells
+
+
+# FUNCTION 46: THIS FUNCTION BUILDS (OR RELOADS FROM DISK) THE FOOTPRINT INDEX OF A LIST OF FILES
+def build_footprint_index(asset_paths, index_path=None, max_workers=None):
+    index = {}
+    if index_path is not None and os.path.exists(index_path):
+        with open(index_path, 'r') as f:
+            index = json.load(f)
+
+    def file_signature(path):
+        stat = os.stat(path)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    # Only the files that are new or changed since the index was saved need to be opened
+    signatures = {path: file_signature(path) for path in dict.fromkeys(asset_paths)}
+    stale_paths = [path for path, signature in signatures.items()
+                   if path not in index or index[path]['signature'] != signature]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {path: executor.submit(get_file_footprint, path) for path in stale_paths}
+        for path, future in futures.items():
+            try:
+                index[path] = {'signature': signatures[path], 'footprint': future.result()}
+            except Exception as e:
+                # One unreadable file must not stop the whole batch; it is catalogued without a footprint, and
+                # without a signature so it is read again on the next run
+                print(f"Failed to read the footprint of {path}: {e}")
+                index[path] = {'signature': None, 'footprint': None}
+
+    if index_path is not None and stale_paths:
+        with open(index_path, 'w') as f:
+            json.dump(index, f)
+
+    return {path: index[path]['footprint'] for path in signatures}
+
+
+# FUNCTION 47: THIS FUNCTION GROUPS A LIST OF FILES INTO THE FEWEST GEOHASH CELLS COVERING THEM
+def group_assets_by_cell(asset_paths, precision=GEOHASH_PRECISION, index_path=None, max_workers=None):
+    footprints = build_footprint_index(asset_paths, index_path, max_workers)
+
+    geospatial_paths = [path for path in asset_paths if footprints[path] is not None]
+    cells = covering_geohashes([footprints[path] for path in geospatial_paths], precision) if geospatial_paths else []
+
+    # Sorting puts every cell right after the cells that contain it, so a single sweep over the sorted cells
+    # merges every asset into the largest cell already covering it. A file split across several cells can be
+    # merged more than once into the same larger cell, so it is only added to each group once
+    groups = {}
+    current_cell, current_paths = None, set()
+    cell_paths = [(cell, path) for path_cells, path in zip(cells, geospatial_paths) for cell in path_cells]
+    for cell, path in sorted(cell_paths):
+        if current_cell is None or not cell.startswith(current_cell):
+            current_cell, current_paths = cell, set()
+            groups[current_cell] = []
+        if path not in current_paths:
+            current_paths.add(path)
+            groups[current_cell].append(path)
+
+    non_geospatial_paths = [path for path in asset_paths if footprints[path] is None]
+    if non_geospatial_paths:
+        groups.setdefault(NON_GEOSPATIAL_CELL_ID, []).extend(non_geospatial_paths)
+
+    return groups
+
+
+# FUNCTION 48: THIS IS A FUNCTION FOR CATALOGUING A BATCH OF FILES INTO WELL-PARTITIONED STAC ITEMS
+def stac_catalog_batch(vpm_id, licence, asset_paths, original_path, precision=GEOHASH_PRECISION, index_path=None,
+                       thumbnail_dir=None, thumbnail_base_url=None, thumbnail_format='png',
+                       thumbnail_max_size=THUMBNAIL_MAX_SIZE):
+    original_paths = dict(zip(asset_paths, original_path))
+    groups = group_assets_by_cell(asset_paths, precision, index_path)
+
+    # Create the collection once if it doesn't exist yet
+    if read_stac_collection(vpm_id) is None:
+        create_stac_collection(vpm_id, licence,
+                               start_datetime=None,
+                               end_datetime=None,
+                               spatial_extent=None)
+
+    # Create or update one STAC Item per cell
+    item_ids = []
+    for cell_id, cell_paths in groups.items():
+        cell_original_paths = [original_paths[path] for path in cell_paths]
+        if read_stac_item(vpm_id, cell_id) is None:
+            create_stac_item(vpm_id, cell_id, cell_paths, None, cell_original_paths, thumbnail_dir,
+                             thumbnail_base_url, thumbnail_format, thumbnail_max_size)
+        else:
+            update_stac_item(vpm_id, cell_id, cell_paths, cell_original_paths, thumbnail_dir,
+                             thumbnail_base_url, thumbnail_format, thumbnail_max_size)
+        item_ids.append(f"{cell_id}_{vpm_id}")
+
+    # Update the collection extent once for the whole batch
+    update_stac_collection(vpm_id)
+
+    return item_ids
+
+
 # End of Python Script
@@ -0,0 +1,42 @@
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault('CATALOG_SERVICE', 'http://localhost:8080')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+cataloguer = pytest.importorskip('cataloguer')
+
+
+def test_covering_geohashes_keeps_a_small_footprint_in_one_cell():
+    assert cataloguer.covering_geohashes([[10.0, 50.0, 10.01, 50.01]]) == [['u0zh']]
+
+
+def test_covering_geohashes_splits_a_footprint_across_the_0_meridian():
+    assert cataloguer.covering_geohashes([[-0.5, 51.3, 0.3, 51.7]]) == [['gcp', 'u10']]
+
+
+def test_covering_geohashes_splits_a_footprint_across_the_antimeridian():
+    assert cataloguer.covering_geohashes([[179.9, 10.0, -179.9, 10.1]]) == [['xcz', '81b']]
+
+
+def test_boundary_straddling_tile_does_not_absorb_its_neighbours(monkeypatch):
+    # A ~2 km tile across the u0/u2 boundary, whose only covering cell is the continent-sized 'u'
+    footprints = {
+        'straddling.tif': [11.24, 50.0, 11.26, 50.02],
+        'u0zu.tif': [11.0, 49.95, 11.2, 50.05],
+        'u2bs.tif': [12.0, 49.95, 12.25, 50.05],
+        'u31zy.tif': [13.98, 51.99, 14.01, 52.02],
+    }
+    monkeypatch.setattr(cataloguer, 'build_footprint_index',
+                        lambda asset_paths, index_path=None, max_workers=None: footprints)
+
+    groups = cataloguer.group_assets_by_cell(list(footprints))
+
+    assert groups == {
+        'u0zu': ['u0zu.tif', 'straddling.tif'],
+        'u2bh2': ['straddling.tif'],
+        'u2bh8': ['straddling.tif'],
+        'u2bs': ['u2bs.tif'],
+        'u31zy': ['u31zy.tif'],
+    }